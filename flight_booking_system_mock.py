@@ -5,9 +5,25 @@ without needing an actual API key.
 """
 
 import json
+from dataclasses import dataclass, asdict
 from datetime import datetime
+from operator import itemgetter
 from typing import Literal
 import re
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional accelerator; stdlib json is used otherwise
+    orjson = None
+
+
+def _dump(obj) -> str:
+    """Encode a tool response as indented JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
 
 # ============================================================================
 # DATABASE (Same as real version)
@@ -28,96 +44,243 @@ FLIGHTS_DB = {
     ],
 }
 
-BOOKINGS = {}
+# Flight ID -> (route, flight) index; holds references to the FLIGHTS_DB dicts
+FLIGHT_INDEX = {
+    flight["id"]: (route, flight)
+    for route, flights in FLIGHTS_DB.items()
+    for flight in flights
+}
+
+@dataclass(slots=True)
+class Booking:
+    """A booking record stored in BOOKINGS"""
+    booking_id: str
+    flight_id: str
+    passengers: int
+    cabin_class: str
+    passenger_name: str
+    total_price: float
+    status: str
+    
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+BOOKINGS: dict[str, Booking] = {}
 BOOKING_COUNTER = 1000
 
+# Rendered search_flights responses keyed by (origin, destination, date),
+# stored as (expires_at, json). Entries for a route are dropped whenever its
+# seat counts change, since they appear in the payload.
+_SEARCH_CACHE = {}
+_SEARCH_CACHE_MAXSIZE = 256
+_SEARCH_TTL = 600           # seconds, for routes with flights
+_SEARCH_NEGATIVE_TTL = 60   # seconds, for "no flights" responses
+
 # ============================================================================
 # TOOLS (Same as real version)
 # ============================================================================
 
-def search_flights(origin: str, destination: str, departure_date: str) -> str:
-    """Search for available flights"""
+# Shape of a flight number (two-letter carrier code + three digits)
+_FLIGHT_ID_RE = re.compile(r'\b[A-Z]{2}\d{3}\b')
+
+# Static error messages, encoded once (dynamic ones are encoded per call)
+_ERR_INVALID_PAX = "Passengers must be between 1 and 9"
+_ERR_INSUFFICIENT = "Insufficient seats"
+_ENCODED_ERRORS = {
+    message: json.dumps({"error": message})
+    for message in (_ERR_INVALID_PAX, _ERR_INSUFFICIENT)
+}
+
+def _render(result: dict) -> str:
+    """Encode a tool payload: errors compact, results indented"""
+    if "error" in result:
+        encoded = _ENCODED_ERRORS.get(result["error"]) if len(result) == 1 else None
+        return encoded or json.dumps(result)
+    return _dump(result)
+
+
+_CABIN_MULTIPLIER = {"economy": 1.0, "business": 2.5, "first": 4.0}
+
+
+def _booking_total(base_price: float, passengers: int, cabin_class: str) -> float:
+    """Total fare for a booking: base price x passengers x cabin multiplier"""
+    return round(base_price * passengers * _CABIN_MULTIPLIER[cabin_class], 2)
+
+
+def _search_cache_get(key):
+    """Return a cached search response, or None if missing or expired"""
+    entry = _SEARCH_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, out = entry
+    if expires_at < time.monotonic():
+        del _SEARCH_CACHE[key]
+        return None
+    return out
+
+
+def _search_cache_put(key, out: str, ttl: float) -> None:
+    """Store a search response, evicting the oldest entry when full"""
+    if len(_SEARCH_CACHE) >= _SEARCH_CACHE_MAXSIZE:
+        del _SEARCH_CACHE[next(iter(_SEARCH_CACHE))]
+    _SEARCH_CACHE[key] = (time.monotonic() + ttl, out)
+
+
+def _invalidate_search_route(route: str) -> None:
+    """Drop cached search responses for a route after its seats change"""
+    for key in [k for k in _SEARCH_CACHE if f"{k[0]}-{k[1]}" == route]:
+        del _SEARCH_CACHE[key]
+
+
+def _search_flights_impl(origin: str, destination: str, departure_date: str) -> dict:
+    """Search for available flights, returning the response payload"""
     route = f"{origin}-{destination}"
     flights = FLIGHTS_DB.get(route, [])
     
     if not flights:
-        return json.dumps({"error": f"No flights for route {origin} to {destination}"})
+        return {"error": f"No flights for route {origin} to {destination}"}
     
-    return json.dumps({
+    return {
         "route": f"{origin} → {destination}",
         "date": departure_date,
         "flights": flights,
         "count": len(flights)
-    }, indent=2)
+    }
+
+
+def search_flights(origin: str, destination: str, departure_date: str) -> str:
+    """Search for available flights"""
+    origin, destination = origin.upper(), destination.upper()
+    key = (origin, destination, departure_date)
+    cached = _search_cache_get(key)
+    if cached is not None:
+        return cached
+    
+    result = _search_flights_impl(origin, destination, departure_date)
+    out = _render(result)
+    _search_cache_put(key, out, _SEARCH_NEGATIVE_TTL if "error" in result else _SEARCH_TTL)
+    return out
+
+
+def _check_flight_availability_impl(flight_id: str, passengers: int) -> dict:
+    """Check if flight has enough seats, returning the response payload"""
+    if not 1 <= passengers <= 9:
+        return {"error": _ERR_INVALID_PAX}
+    
+    entry = FLIGHT_INDEX.get(flight_id) if _FLIGHT_ID_RE.fullmatch(flight_id) else None
+    if entry is None:
+        return {"error": f"Flight {flight_id} not found"}
+    
+    route, flight = entry
+    available = flight["seats"]
+    can_book = available >= passengers
+    
+    return {
+        "flight_id": flight_id,
+        "route": route,
+        "passengers_requested": passengers,
+        "seats_available": available,
+        "can_book": can_book,
+        "price_per_person": flight["price"],
+        "total_price": flight["price"] * passengers if can_book else None,
+    }
 
 
 def check_flight_availability(flight_id: str, passengers: int) -> str:
     """Check if flight has enough seats"""
-    for route, flights in FLIGHTS_DB.items():
-        for flight in flights:
-            if flight["id"] == flight_id:
-                available = flight["seats"]
-                can_book = available >= passengers
-                
-                return json.dumps({
-                    "flight_id": flight_id,
-                    "route": route,
-                    "passengers_requested": passengers,
-                    "seats_available": available,
-                    "can_book": can_book,
-                    "price_per_person": flight["price"],
-                    "total_price": flight["price"] * passengers if can_book else None,
-                }, indent=2)
-    
-    return json.dumps({"error": f"Flight {flight_id} not found"})
+    return _render(_check_flight_availability_impl(flight_id, passengers))
+
+
+def _book_flight_impl(flight_id: str, passengers: int, cabin_class: str,
+                      passenger_name: str, passenger_email: str) -> dict:
+    """Book a flight, returning the response payload"""
+    global BOOKING_COUNTER
+    
+    if not 1 <= passengers <= 9:
+        return {"error": _ERR_INVALID_PAX}
+    
+    entry = FLIGHT_INDEX.get(flight_id) if _FLIGHT_ID_RE.fullmatch(flight_id) else None
+    if entry is None:
+        return {"error": f"Flight {flight_id} not found"}
+    
+    route, flight = entry
+    if flight["seats"] < passengers:
+        return {"error": _ERR_INSUFFICIENT}
+    
+    # Calculate price
+    total_price = _booking_total(flight["price"], passengers, cabin_class)
+    
+    # Create booking
+    booking_id = f"BK{BOOKING_COUNTER}"
+    BOOKING_COUNTER += 1
+    
+    booking = Booking(
+        booking_id=booking_id,
+        flight_id=flight_id,
+        passengers=passengers,
+        cabin_class=cabin_class,
+        passenger_name=passenger_name,
+        total_price=total_price,
+        status="CONFIRMED"
+    )
+    
+    BOOKINGS[booking_id] = booking
+    flight["seats"] -= passengers
+    _invalidate_search_route(route)
+    
+    return {
+        "success": True,
+        "message": "Flight booked successfully!",
+        "booking": booking.to_dict()
+    }
 
 
 def book_flight(flight_id: str, passengers: int, cabin_class: str, 
                 passenger_name: str, passenger_email: str) -> str:
     """Book a flight"""
-    global BOOKING_COUNTER
-    
-    for route, flights in FLIGHTS_DB.items():
-        for flight in flights:
-            if flight["id"] == flight_id:
-                if flight["seats"] < passengers:
-                    return json.dumps({"error": "Insufficient seats"})
-                
-                # Calculate price
-                base_price = flight["price"]
-                multiplier = {"economy": 1.0, "business": 2.5, "first": 4.0}[cabin_class]
-                total_price = base_price * passengers * multiplier
-                
-                # Create booking
-                booking_id = f"BK{BOOKING_COUNTER}"
-                BOOKING_COUNTER += 1
-                
-                booking = {
-                    "booking_id": booking_id,
-                    "flight_id": flight_id,
-                    "passengers": passengers,
-                    "cabin_class": cabin_class,
-                    "passenger_name": passenger_name,
-                    "total_price": round(total_price, 2),
-                    "status": "CONFIRMED"
-                }
-                
-                BOOKINGS[booking_id] = booking
-                flight["seats"] -= passengers
-                
-                return json.dumps({
-                    "success": True,
-                    "message": "Flight booked successfully!",
-                    "booking": booking
-                }, indent=2)
-    
-    return json.dumps({"error": f"Flight {flight_id} not found"})
+    return _render(_book_flight_impl(
+        flight_id, passengers, cabin_class, passenger_name, passenger_email
+    ))
 
 
 # ============================================================================
 # MOCK CLAUDE (Simulates AI behavior)
 # ============================================================================
 
+# Patterns used by MockClaude.process_message (compiled once at import)
+_NAME_RE = re.compile(r'name:?\s*([A-Za-z\s]+?)(?:,|email|$)', re.IGNORECASE)
+_EMAIL_RE = re.compile(r'email:?\s*([\w\.-]+@[\w\.-]+\.\w+)', re.IGNORECASE)
+
+# Single-word keywords are checked against the message's token set;
+# multi-word phrases are folded into single alternations
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# Word-prefix stems, so "checking", "seat" or "booking" still match
+_CHECK_RE = re.compile(r'\bcheck')
+_AVAIL_RE = re.compile(r'\b(?:availab|seat)')
+_BOOK_RE = re.compile(r'\bbook')
+_SEARCH_RE = re.compile(r'search|find|fly|flight from|show me')
+_PAX_RE = re.compile(r'for ([123])\b|([123])\s*(?:people|passengers?|person)')
+
+# City-pair phrase -> (origin, destination); matched with one alternation
+_CITY_PAIR_MAP = {
+    "nyc to tokyo": ("NYC", "TYO"),
+    "new york to tokyo": ("NYC", "TYO"),
+    "nyc to london": ("NYC", "LON"),
+    "lax to tokyo": ("LAX", "TYO"),
+    "los angeles to tokyo": ("LAX", "TYO"),
+}
+_CITY_PAIR_RE = re.compile("|".join(re.escape(pair) for pair in _CITY_PAIR_MAP))
+
+
+@dataclass(slots=True)
+class _Message:
+    """A user message in the forms the intent handlers read"""
+    text: str
+    lower: str
+    tokens: set
+
+
 class MockClaude:
     """Simulates Claude's decision-making for demo purposes"""
     
@@ -126,6 +289,96 @@ class MockClaude:
         self.last_flight_searched = None
         self.last_route = None
     
+    def _handle_search(self, message: _Message):
+        """PATTERN 1: Search for flights (None if no known route is named)"""
+        # Extract cities (simplified - real Claude uses NLP)
+        pair_match = _CITY_PAIR_RE.search(message.lower)
+        if not pair_match:
+            return None
+        origin, destination = _CITY_PAIR_MAP[pair_match.group(0)]
+        
+        # Extract date (simplified)
+        date = "2025-02-15"  # Default date
+        if "march" in message.tokens:
+            date = "2025-03-01"
+        
+        self.last_route = f"{origin}-{destination}"
+        
+        return {
+            "tool_call": "search_flights",
+            "args": {
+                "origin": origin,
+                "destination": destination,
+                "departure_date": date
+            },
+            "reasoning": f"User wants to search for flights from {origin} to {destination}"
+        }
+    
+    def _handle_check(self, message: _Message):
+        """PATTERN 2: Check availability"""
+        # Extract flight ID
+        flight_match = _FLIGHT_ID_RE.search(message.text.upper())
+        flight_id = flight_match.group(0) if flight_match else "JL005"
+        
+        # Extract passenger count
+        pax_match = _PAX_RE.search(message.lower)
+        passenger_count = int(pax_match.group(1) or pax_match.group(2)) if pax_match else 2  # Default
+        
+        self.last_flight_searched = flight_id
+        
+        return {
+            "tool_call": "check_flight_availability",
+            "args": {
+                "flight_id": flight_id,
+                "passengers": passenger_count
+            },
+            "reasoning": f"User wants to check if flight {flight_id} has {passenger_count} seats"
+        }
+    
+    def _handle_book(self, message: _Message):
+        """PATTERN 3: Book flight"""
+        # Flight ID
+        flight_match = _FLIGHT_ID_RE.search(message.text.upper())
+        flight_id = flight_match.group(0) if flight_match else self.last_flight_searched or "JL005"
+        
+        # Passengers
+        pax_match = _PAX_RE.search(message.lower)
+        passenger_count = int(pax_match.group(1) or pax_match.group(2)) if pax_match else 2
+        
+        # Cabin class
+        cabin_class = "economy"
+        if "business" in message.tokens:
+            cabin_class = "business"
+        elif "first" in message.tokens:
+            cabin_class = "first"
+        
+        # Name and email
+        name_match = _NAME_RE.search(message.text)
+        email_match = _EMAIL_RE.search(message.text)
+        
+        passenger_name = name_match.group(1).strip() if name_match else "John Doe"
+        passenger_email = email_match.group(1).strip() if email_match else "user@email.com"
+        
+        return {
+            "tool_call": "book_flight",
+            "args": {
+                "flight_id": flight_id,
+                "passengers": passenger_count,
+                "cabin_class": cabin_class,
+                "passenger_name": passenger_name,
+                "passenger_email": passenger_email
+            },
+            "reasoning": f"User wants to book flight {flight_id} for {passenger_count} passengers"
+        }
+    
+    # (matcher on the lowercased message, handler) pairs in priority order;
+    # only the first matching intent's handler runs
+    _INTENTS = (
+        (lambda msg_lower: _SEARCH_RE.search(msg_lower), _handle_search),
+        (lambda msg_lower: _CHECK_RE.search(msg_lower) and _AVAIL_RE.search(msg_lower), _handle_check),
+        (lambda msg_lower: _BOOK_RE.search(msg_lower), _handle_book),
+    )
+    
     def process_message(self, user_message: str):
         """
         Simulates Claude's understanding and tool selection.
@@ -133,103 +386,13 @@ class MockClaude:
         """
         msg_lower = user_message.lower()
         
-        # PATTERN 1: Search for flights
-        if any(word in msg_lower for word in ["search", "find", "fly", "flight from", "show me"]):
-            # Extract cities (simplified - real Claude uses NLP)
-            origin = None
-            destination = None
-            
-            if "nyc to tokyo" in msg_lower or "new york to tokyo" in msg_lower:
-                origin, destination = "NYC", "TYO"
-            elif "nyc to london" in msg_lower:
-                origin, destination = "NYC", "LON"
-            elif "lax to tokyo" in msg_lower or "los angeles to tokyo" in msg_lower:
-                origin, destination = "LAX", "TYO"
-            
-            if origin and destination:
-                # Extract date (simplified)
-                date = "2025-02-15"  # Default date
-                if "march" in msg_lower:
-                    date = "2025-03-01"
-                
-                self.last_route = f"{origin}-{destination}"
-                
-                return {
-                    "tool_call": "search_flights",
-                    "args": {
-                        "origin": origin,
-                        "destination": destination,
-                        "departure_date": date
-                    },
-                    "reasoning": f"User wants to search for flights from {origin} to {destination}"
-                }
-        
-        # PATTERN 2: Check availability
-        elif "check" in msg_lower and ("availability" in msg_lower or "seats" in msg_lower or "available" in msg_lower):
-            # Extract flight ID
-            flight_match = re.search(r'([A-Z]{2}\d{3})', user_message.upper())
-            flight_id = flight_match.group(1) if flight_match else "JL005"
-            
-            # Extract passenger count
-            passenger_count = 2  # Default
-            if "for 3" in msg_lower or "3 people" in msg_lower or "3 passengers" in msg_lower:
-                passenger_count = 3
-            elif "for 2" in msg_lower or "2 people" in msg_lower or "2 passengers" in msg_lower:
-                passenger_count = 2
-            elif "for 1" in msg_lower or "1 person" in msg_lower or "1 passenger" in msg_lower:
-                passenger_count = 1
-            
-            self.last_flight_searched = flight_id
-            
-            return {
-                "tool_call": "check_flight_availability",
-                "args": {
-                    "flight_id": flight_id,
-                    "passengers": passenger_count
-                },
-                "reasoning": f"User wants to check if flight {flight_id} has {passenger_count} seats"
-            }
-        
-        # PATTERN 3: Book flight
-        elif "book" in msg_lower:
-            # Extract details
-            
-            # Flight ID
-            flight_match = re.search(r'([A-Z]{2}\d{3})', user_message.upper())
-            flight_id = flight_match.group(1) if flight_match else self.last_flight_searched or "JL005"
-            
-            # Passengers
-            passenger_count = 2
-            if "for 3" in msg_lower or "3 people" in msg_lower:
-                passenger_count = 3
-            elif "for 2" in msg_lower or "2 people" in msg_lower:
-                passenger_count = 2
-            
-            # Cabin class
-            cabin_class = "economy"
-            if "business" in msg_lower:
-                cabin_class = "business"
-            elif "first class" in msg_lower or "first" in msg_lower:
-                cabin_class = "first"
-            
-            # Name and email
-            name_match = re.search(r'name:?\s*([A-Za-z\s]+?)(?:,|email|$)', user_message, re.IGNORECASE)
-            email_match = re.search(r'email:?\s*([\w\.-]+@[\w\.-]+\.\w+)', user_message, re.IGNORECASE)
-            
-            passenger_name = name_match.group(1).strip() if name_match else "John Doe"
-            passenger_email = email_match.group(1).strip() if email_match else "user@email.com"
-            
-            return {
-                "tool_call": "book_flight",
-                "args": {
-                    "flight_id": flight_id,
-                    "passengers": passenger_count,
-                    "cabin_class": cabin_class,
-                    "passenger_name": passenger_name,
-                    "passenger_email": passenger_email
-                },
-                "reasoning": f"User wants to book flight {flight_id} for {passenger_count} passengers"
-            }
+        for matches, handle in self._INTENTS:
+            if matches(msg_lower):
+                message = _Message(user_message, msg_lower, set(_TOKEN_RE.findall(msg_lower)))
+                decision = handle(self, message)
+                if decision is not None:
+                    return decision
+                break
         
         # No tool needed - just conversation
         return {
@@ -243,15 +406,36 @@ class MockClaude:
 # DEMO RUNNER
 # ============================================================================
 
+class _Out:
+    """Collects output lines and writes them to stdout in a single call"""
+    
+    def __init__(self):
+        self.lines = []
+    
+    def append(self, line: str) -> None:
+        self.lines.append(line)
+    
+    def extend(self, lines) -> None:
+        self.lines.extend(lines)
+    
+    def flush(self) -> None:
+        if self.lines:
+            sys.stdout.write("\n".join(self.lines) + "\n")
+            sys.stdout.flush()
+            self.lines.clear()
+
+
 def run_mock_demo():
     """Run a demonstration of the booking system"""
+    out = _Out()
     
-    print("\n" + "="*70)
-    print("✈️  FLIGHT BOOKING SYSTEM - MOCK DEMO")
-    print("="*70)
-    print("\n📝 This simulates how Claude would interact with the booking tools")
-    print("    (No API key needed - this is for learning!)")
-    print("\n" + "="*70 + "\n")
+    out.append("\n" + "="*70)
+    out.append("✈️  FLIGHT BOOKING SYSTEM - MOCK DEMO")
+    out.append("="*70)
+    out.append("\n📝 This simulates how Claude would interact with the booking tools")
+    out.append("    (No API key needed - this is for learning!)")
+    out.append("\n" + "="*70 + "\n")
+    out.flush()
     
     claude = MockClaude()
     tools = {
@@ -263,8 +447,8 @@ def run_mock_demo():
     # ========================================================================
     # SCENARIO 1: Complete Booking Flow
     # ========================================================================
-    print("\n📌 SCENARIO 1: Search → Check → Book")
-    print("-" * 70)
+    out.append("\n📌 SCENARIO 1: Search → Check → Book")
+    out.append("-" * 70)
     
     scenarios = [
         "I want to fly from NYC to Tokyo on February 15th",
@@ -273,50 +457,51 @@ def run_mock_demo():
     ]
     
     for i, user_msg in enumerate(scenarios, 1):
-        print(f"\n{'='*70}")
-        print(f"STEP {i}")
-        print(f"{'='*70}")
-        print(f"\n👤 USER: {user_msg}")
+        out.append(f"\n{'='*70}")
+        out.append(f"STEP {i}")
+        out.append(f"{'='*70}")
+        out.append(f"\n👤 USER: {user_msg}")
         
         # Claude processes the message
         decision = claude.process_message(user_msg)
         
-        print(f"\n🤖 CLAUDE'S THINKING: {decision['reasoning']}")
+        out.append(f"\n🤖 CLAUDE'S THINKING: {decision['reasoning']}")
         
         if decision['tool_call']:
             tool_name = decision['tool_call']
             tool_args = decision['args']
             
-            print(f"\n🔧 TOOL CALL: {tool_name}")
-            print(f"   Arguments:")
+            out.append(f"\n🔧 TOOL CALL: {tool_name}")
+            out.append(f"   Arguments:")
             for key, value in tool_args.items():
-                print(f"     • {key}: {value}")
+                out.append(f"     • {key}: {value}")
             
             # Execute the tool
             result = tools[tool_name](**tool_args)
             
-            print(f"\n📊 TOOL RESULT:")
-            print(f"   {result[:300]}..." if len(result) > 300 else f"   {result}")
+            out.append(f"\n📊 TOOL RESULT:")
+            out.append(f"   {result[:300]}..." if len(result) > 300 else f"   {result}")
             
             # Claude's response to user
             if "error" not in result.lower():
                 if tool_name == "search_flights":
-                    print(f"\n💬 CLAUDE: I found some flights for you! Let me know if you'd like to check availability on any of these.")
+                    out.append(f"\n💬 CLAUDE: I found some flights for you! Let me know if you'd like to check availability on any of these.")
                 elif tool_name == "check_flight_availability":
-                    print(f"\n💬 CLAUDE: Great news! This flight has enough seats. Would you like to book it?")
+                    out.append(f"\n💬 CLAUDE: Great news! This flight has enough seats. Would you like to book it?")
                 elif tool_name == "book_flight":
-                    print(f"\n💬 CLAUDE: Perfect! I've successfully booked your flight. You'll receive a confirmation email shortly.")
+                    out.append(f"\n💬 CLAUDE: Perfect! I've successfully booked your flight. You'll receive a confirmation email shortly.")
             else:
-                print(f"\n💬 CLAUDE: I encountered an issue: {result}")
+                out.append(f"\n💬 CLAUDE: I encountered an issue: {result}")
         else:
-            print(f"\n💬 CLAUDE: {decision['response']}")
+            out.append(f"\n💬 CLAUDE: {decision['response']}")
+        out.flush()
     
     # ========================================================================
     # SCENARIO 2: Complex Single Request
     # ========================================================================
-    print("\n\n" + "="*70)
-    print("📌 SCENARIO 2: All-in-One Booking Request")
-    print("-" * 70)
+    out.append("\n\n" + "="*70)
+    out.append("📌 SCENARIO 2: All-in-One Booking Request")
+    out.append("-" * 70)
     
     complex_request = (
         "I need to book a flight from LAX to Tokyo for 3 people in economy "
@@ -324,76 +509,81 @@ def run_mock_demo():
         "Please search for flights and book the cheapest option."
     )
     
-    print(f"\n👤 USER: {complex_request}")
+    out.append(f"\n👤 USER: {complex_request}")
     
-    print(f"\n🤖 CLAUDE'S MULTI-STEP PLAN:")
-    print(f"   1. Search for flights LAX → Tokyo")
-    print(f"   2. Identify cheapest option")
-    print(f"   3. Check availability for 3 passengers")
-    print(f"   4. Book the flight")
+    out.append(f"\n🤖 CLAUDE'S MULTI-STEP PLAN:")
+    out.append(f"   1. Search for flights LAX → Tokyo")
+    out.append(f"   2. Identify cheapest option")
+    out.append(f"   3. Check availability for 3 passengers")
+    out.append(f"   4. Book the flight")
     
     # Step 1: Search
-    print(f"\n{'─'*70}")
-    print("EXECUTING STEP 1: Search flights")
-    print(f"{'─'*70}")
-    result1 = search_flights("LAX", "TYO", "2025-03-01")
-    print(f"Result: {result1[:200]}...")
+    out.append(f"\n{'─'*70}")
+    out.append("EXECUTING STEP 1: Search flights")
+    out.append(f"{'─'*70}")
+    flights_data = _search_flights_impl("LAX", "TYO", "2025-03-01")
+    result1 = _dump(flights_data)
+    out.append(f"Result: {result1[:200]}...")
     
     # Step 2: Find cheapest
-    flights_data = json.loads(result1)
-    cheapest = min(flights_data['flights'], key=lambda x: x['price'])
-    print(f"\n💭 CLAUDE: The cheapest flight is {cheapest['id']} at ${cheapest['price']}")
+    cheapest = min(flights_data['flights'], key=itemgetter('price'))
+    out.append(f"\n💭 CLAUDE: The cheapest flight is {cheapest['id']} at ${cheapest['price']}")
     
     # Step 3: Check availability
-    print(f"\n{'─'*70}")
-    print("EXECUTING STEP 2: Check availability")
-    print(f"{'─'*70}")
+    out.append(f"\n{'─'*70}")
+    out.append("EXECUTING STEP 2: Check availability")
+    out.append(f"{'─'*70}")
     result2 = check_flight_availability(cheapest['id'], 3)
-    print(f"Result: {result2[:200]}...")
+    out.append(f"Result: {result2[:200]}...")
     
     # Step 4: Book
-    print(f"\n{'─'*70}")
-    print("EXECUTING STEP 3: Book flight")
-    print(f"{'─'*70}")
-    result3 = book_flight(
+    out.append(f"\n{'─'*70}")
+    out.append("EXECUTING STEP 3: Book flight")
+    out.append(f"{'─'*70}")
+    booking_data = _book_flight_impl(
         cheapest['id'], 3, "economy", 
         "Mike Johnson", "mike.j@email.com"
     )
-    booking_data = json.loads(result3)
-    print(f"Result: {result3}")
+    result3 = _dump(booking_data)
+    out.append(f"Result: {result3}")
     
-    print(f"\n💬 CLAUDE: Excellent! I've booked flight {cheapest['id']} for 3 passengers.")
-    print(f"   • Total cost: ${booking_data['booking']['total_price']}")
-    print(f"   • Booking ID: {booking_data['booking']['booking_id']}")
-    print(f"   • Confirmation sent to: mike.j@email.com")
+    out.append(f"\n💬 CLAUDE: Excellent! I've booked flight {cheapest['id']} for 3 passengers.")
+    out.append(f"   • Total cost: ${booking_data['booking']['total_price']}")
+    out.append(f"   • Booking ID: {booking_data['booking']['booking_id']}")
+    out.append(f"   • Confirmation sent to: mike.j@email.com")
+    out.flush()
     
     # ========================================================================
     # FINAL SUMMARY
     # ========================================================================
-    print("\n\n" + "="*70)
-    print("📊 BOOKING SUMMARY")
-    print("="*70)
-    print(f"\nTotal Bookings Made: {len(BOOKINGS)}")
-    print(f"\nBooking Details:")
-    for booking_id, booking in BOOKINGS.items():
-        print(f"\n  {booking_id}:")
-        print(f"    • Passenger: {booking['passenger_name']}")
-        print(f"    • Flight: {booking['flight_id']}")
-        print(f"    • Seats: {booking['passengers']} × {booking['cabin_class']}")
-        print(f"    • Total: ${booking['total_price']}")
-        print(f"    • Status: {booking['status']}")
-    
-    print("\n\n" + "="*70)
-    print("✅ DEMO COMPLETE!")
-    print("="*70)
-    print("\n💡 KEY CONCEPTS DEMONSTRATED:")
-    print("   1. ✅ Strict type checking (passengers: int, not '2' or 'two')")
-    print("   2. ✅ Multi-step workflows (search → check → book)")
-    print("   3. ✅ Conversation context (Claude remembers previous steps)")
-    print("   4. ✅ Complex request handling (single message → multiple tools)")
-    print("   5. ✅ Business logic (pricing, inventory, validation)")
-    print("\n🎓 This is how Claude + LangChain works in real applications!")
-    print("\n" + "="*70 + "\n")
+    out.append("\n\n" + "="*70)
+    out.append("📊 BOOKING SUMMARY")
+    out.append("="*70)
+    out.append(f"\nTotal Bookings Made: {len(BOOKINGS)}")
+    out.append(f"\nBooking Details:")
+    out.extend(
+        f"\n  {booking_id}:\n"
+        f"    • Passenger: {booking.passenger_name}\n"
+        f"    • Flight: {booking.flight_id}\n"
+        f"    • Seats: {booking.passengers} × {booking.cabin_class}\n"
+        f"    • Total: ${booking.total_price}\n"
+        f"    • Status: {booking.status}"
+        for booking_id, booking in BOOKINGS.items()
+    )
+    out.flush()
+    
+    out.append("\n\n" + "="*70)
+    out.append("✅ DEMO COMPLETE!")
+    out.append("="*70)
+    out.append("\n💡 KEY CONCEPTS DEMONSTRATED:")
+    out.append("   1. ✅ Strict type checking (passengers: int, not '2' or 'two')")
+    out.append("   2. ✅ Multi-step workflows (search → check → book)")
+    out.append("   3. ✅ Conversation context (Claude remembers previous steps)")
+    out.append("   4. ✅ Complex request handling (single message → multiple tools)")
+    out.append("   5. ✅ Business logic (pricing, inventory, validation)")
+    out.append("\n🎓 This is how Claude + LangChain works in real applications!")
+    out.append("\n" + "="*70 + "\n")
+    out.flush()
 
 
 # ============================================================================
@@ -405,89 +595,92 @@ def interactive_mode():
     Run the system in interactive mode.
     Type your booking requests and see how Claude processes them!
     """
-    print("\n" + "="*70)
-    print("✈️  INTERACTIVE FLIGHT BOOKING SYSTEM")
-    print("="*70)
-    print("\n📝 Enter your booking requests below.")
-    print("   Examples:")
-    print("   • 'Search for flights from NYC to Tokyo'")
-    print("   • 'Check if flight JL005 has seats for 2 passengers'")
-    print("   • 'Book flight JL005 for 2, business class, name: John, email: john@email.com'")
-    print("\n   Type 'exit' to quit, 'help' for examples, 'status' for current bookings")
-    print("\n" + "="*70 + "\n")
+    out = _Out()
+    out.append("\n" + "="*70)
+    out.append("✈️  INTERACTIVE FLIGHT BOOKING SYSTEM")
+    out.append("="*70)
+    out.append("\n📝 Enter your booking requests below.")
+    out.append("   Examples:")
+    out.append("   • 'Search for flights from NYC to Tokyo'")
+    out.append("   • 'Check if flight JL005 has seats for 2 passengers'")
+    out.append("   • 'Book flight JL005 for 2, business class, name: John, email: john@email.com'")
+    out.append("\n   Type 'exit' to quit, 'help' for examples, 'status' for current bookings")
+    out.append("\n" + "="*70 + "\n")
     
     claude = MockClaude()
+    # Structured payloads; encoded only for display
     tools = {
-        "search_flights": search_flights,
-        "check_flight_availability": check_flight_availability,
-        "book_flight": book_flight,
+        "search_flights": _search_flights_impl,
+        "check_flight_availability": _check_flight_availability_impl,
+        "book_flight": _book_flight_impl,
     }
     
     while True:
+        out.flush()
         user_input = input("\n👤 YOU: ").strip()
         
         if not user_input:
             continue
         
         if user_input.lower() == 'exit':
-            print("\n✈️  Thanks for using the Flight Booking System! Safe travels!")
+            out.append("\n✈️  Thanks for using the Flight Booking System! Safe travels!")
+            out.flush()
             break
         
         if user_input.lower() == 'help':
-            print("\n📚 HELP - Example Commands:")
-            print("\n  Search:")
-            print("    'I want to fly from NYC to Tokyo on Feb 15'")
-            print("    'Search for flights from LAX to Tokyo'")
-            print("\n  Check Availability:")
-            print("    'Check if flight JL005 has seats for 2 passengers'")
-            print("    'Is JL062 available for 3 people?'")
-            print("\n  Book:")
-            print("    'Book flight JL005 for 2, business class, name: Sarah, email: sarah@email.com'")
-            print("    'Book that flight for 3 in economy, name: Mike, email: mike@email.com'")
+            out.append("\n📚 HELP - Example Commands:")
+            out.append("\n  Search:")
+            out.append("    'I want to fly from NYC to Tokyo on Feb 15'")
+            out.append("    'Search for flights from LAX to Tokyo'")
+            out.append("\n  Check Availability:")
+            out.append("    'Check if flight JL005 has seats for 2 passengers'")
+            out.append("    'Is JL062 available for 3 people?'")
+            out.append("\n  Book:")
+            out.append("    'Book flight JL005 for 2, business class, name: Sarah, email: sarah@email.com'")
+            out.append("    'Book that flight for 3 in economy, name: Mike, email: mike@email.com'")
             continue
         
         if user_input.lower() == 'status':
             if not BOOKINGS:
-                print("\n📊 No bookings yet.")
+                out.append("\n📊 No bookings yet.")
             else:
-                print(f"\n📊 CURRENT BOOKINGS ({len(BOOKINGS)} total):")
+                out.append(f"\n📊 CURRENT BOOKINGS ({len(BOOKINGS)} total):")
                 for booking_id, booking in BOOKINGS.items():
-                    print(f"\n  {booking_id}: {booking['passenger_name']}")
-                    print(f"    Flight: {booking['flight_id']} ({booking['passengers']} seats)")
-                    print(f"    Class: {booking['cabin_class']} | Total: ${booking['total_price']}")
+                    out.append(f"\n  {booking_id}: {booking.passenger_name}")
+                    out.append(f"    Flight: {booking.flight_id} ({booking.passengers} seats)")
+                    out.append(f"    Class: {booking.cabin_class} | Total: ${booking.total_price}")
             continue
         
         # Process user input
         decision = claude.process_message(user_input)
         
-        print(f"\n🤖 CLAUDE: {decision['reasoning']}")
+        out.append(f"\n🤖 CLAUDE: {decision['reasoning']}")
         
         if decision['tool_call']:
             tool_name = decision['tool_call']
             tool_args = decision['args']
             
-            print(f"\n🔧 Using tool: {tool_name}")
+            out.append(f"\n🔧 Using tool: {tool_name}")
             
             # Execute tool
-            result = tools[tool_name](**tool_args)
+            result_data = tools[tool_name](**tool_args)
             
-            print(f"\n📊 Result:")
-            result_data = json.loads(result)
-            print(json.dumps(result_data, indent=2))
+            out.append(f"\n📊 Result:")
+            out.append(_dump(result_data))
             
             # Friendly response
-            if "error" not in result.lower():
+            if "error" not in result_data:
                 if tool_name == "search_flights":
-                    print(f"\n💬 CLAUDE: I found {result_data.get('count', 0)} flights. Would you like to check availability?")
+                    out.append(f"\n💬 CLAUDE: I found {result_data.get('count', 0)} flights. Would you like to check availability?")
                 elif tool_name == "check_flight_availability":
                     if result_data.get('can_book'):
-                        print(f"\n💬 CLAUDE: This flight is available! Would you like to book it?")
+                        out.append(f"\n💬 CLAUDE: This flight is available! Would you like to book it?")
                     else:
-                        print(f"\n💬 CLAUDE: Sorry, not enough seats available.")
+                        out.append(f"\n💬 CLAUDE: Sorry, not enough seats available.")
                 elif tool_name == "book_flight":
-                    print(f"\n💬 CLAUDE: ✅ Booking confirmed! ID: {result_data['booking']['booking_id']}")
+                    out.append(f"\n💬 CLAUDE: ✅ Booking confirmed! ID: {result_data['booking']['booking_id']}")
         else:
-            print(f"\n💬 CLAUDE: {decision['response']}")
+            out.append(f"\n💬 CLAUDE: {decision['response']}")
 
 
 # ============================================================================
@@ -495,8 +688,6 @@ def interactive_mode():
 # ============================================================================
 
 if __name__ == "__main__":
-    import sys
-    
     if len(sys.argv) > 1 and sys.argv[1] == "interactive":
         interactive_mode()
     else:
@@ -5,10 +5,35 @@ and proper error handling.
 """
 
 from langchain_anthropic import ChatAnthropic
-from typing import Literal, Optional
+from langchain_core.messages import AIMessageChunk, ToolCall, ToolCallChunk
+from typing import Any, Callable, Literal, Optional, cast
 from datetime import datetime, timedelta
-from pydantic import BaseModel, Field
+from dataclasses import dataclass, asdict
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+import asyncio
+import atexit
+import inspect
 import json
+import logging
+import re
+import sys
+import threading
+import time
+import weakref
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # Optional accelerator; stdlib json is used otherwise
+    orjson = None  # type: ignore[assignment]
+
+
+def _dump(obj: Any) -> str:
+    """Encode a tool response as indented JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
 
 # ============================================================================
 # CONFIGURATION
@@ -23,7 +48,7 @@ model = ChatAnthropic(
 # DATABASE SIMULATION (In real app, this would be actual database)
 # ============================================================================
 
-FLIGHTS_DB = {
+FLIGHTS_DB: dict[str, list[dict[str, Any]]] = {
     "NYC-LON": [
         {"id": "BA001", "price": 850, "departure": "08:00", "arrival": "20:00", "seats": 45},
         {"id": "AA102", "price": 920, "departure": "14:30", "arrival": "02:30", "seats": 12},
@@ -42,13 +67,117 @@ FLIGHTS_DB = {
     ],
 }
 
-BOOKINGS = {}  # Store confirmed bookings
+# Flight ID -> (route, flight) index; holds references to the FLIGHTS_DB dicts
+FLIGHT_INDEX = {
+    flight["id"]: (route, flight)
+    for route, flights in FLIGHTS_DB.items()
+    for flight in flights
+}
+
+@dataclass(slots=True)
+class Booking:
+    """A booking record stored in BOOKINGS"""
+    booking_id: str
+    flight_id: str
+    route: str
+    passengers: int
+    cabin_class: str
+    passenger_name: str
+    passenger_email: str
+    total_price: float
+    departure: str
+    arrival: str
+    status: str
+    booking_date: str
+    cancellation_date: Optional[str] = None
+    
+    def to_dict(self) -> dict:
+        """Serializable view; cancellation_date only once cancelled"""
+        data = asdict(self)
+        if self.cancellation_date is None:
+            del data["cancellation_date"]
+        return data
+
+
+BOOKINGS: dict[str, Booking] = {}  # Store confirmed bookings
 BOOKING_COUNTER = 1000
 
+# Rendered search_flights responses keyed by (origin, destination, date),
+# stored as (expires_at, json). Entries for a route are dropped whenever its
+# seat counts change, since they appear in the payload.
+_SEARCH_CACHE: dict[tuple[str, str, str], tuple[float, str]] = {}
+_SEARCH_CACHE_MAXSIZE = 256
+_SEARCH_TTL = 600           # seconds, for routes with flights
+_SEARCH_NEGATIVE_TTL = 60   # seconds, for "no flights" responses
+
+# (tool name, canonical JSON args) -> result of a read-only tool call (see
+# _dispatch). Cleared whenever seats or bookings change.
+_TOOL_CACHE: dict[tuple[str, str], str] = {}
+_TOOL_CACHE_MAXSIZE = 256
+
+# Read-only tools may run in worker threads while a booking runs on the event
+# loop. _DATA_VERSION is bumped after every seat/booking change; a result is
+# only cached if the version is unchanged since the call started, so a read
+# that raced a change never outlives the invalidation. Cache writes and
+# invalidations hold _CACHE_LOCK.
+_CACHE_LOCK = threading.Lock()
+_DATA_VERSION = 0
+
 # ============================================================================
 # TOOL DEFINITIONS
 # ============================================================================
 
+# Static error responses (encoded once; dynamic ones are built per call)
+_ERR_SAME_CITY = json.dumps({"error": "Origin and destination cannot be the same"})
+_ERR_INVALID_PAX = json.dumps({"error": "Passengers must be between 1 and 9"})
+_ERR_INVALID_EMAIL = json.dumps({"error": "Invalid email format"})
+_ERR_EMAIL_MISMATCH = json.dumps({"error": "Email does not match booking records"})
+_ERR_ALREADY_CANCELLED = json.dumps({"error": "Booking already cancelled"})
+
+# Shape of a flight number (two-letter carrier code + three digits)
+_FLIGHT_ID_RE = re.compile(r"\b[A-Z]{2}\d{3}\b")
+
+def _search_cache_get(key: tuple[str, str, str]) -> Optional[str]:
+    """Return a cached search response, or None if missing or expired"""
+    entry = _SEARCH_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, out = entry
+    if expires_at < time.monotonic():
+        with _CACHE_LOCK:
+            _SEARCH_CACHE.pop(key, None)
+        return None
+    return out
+
+
+def _search_cache_put(key: tuple[str, str, str], out: str, ttl: float, version: int) -> None:
+    """Store a search response computed at `version`, evicting the oldest entry when full"""
+    with _CACHE_LOCK:
+        if version != _DATA_VERSION:
+            return
+        if len(_SEARCH_CACHE) >= _SEARCH_CACHE_MAXSIZE:
+            _SEARCH_CACHE.pop(next(iter(_SEARCH_CACHE)), None)
+        _SEARCH_CACHE[key] = (time.monotonic() + ttl, out)
+
+
+def _invalidate_caches(route: str) -> None:
+    """Drop cached results made stale by a booking or cancellation on `route`"""
+    global _DATA_VERSION
+    with _CACHE_LOCK:
+        _DATA_VERSION += 1
+        for key in [k for k in _SEARCH_CACHE if f"{k[0]}-{k[1]}" == route]:
+            del _SEARCH_CACHE[key]
+        _TOOL_CACHE.clear()
+
+
+_CABIN_MULTIPLIER = {"economy": 1.0, "business": 2.5, "first": 4.0}
+
+
+def _booking_total(base_price: float, passengers: int, cabin_class: str) -> float:
+    """Total fare for a booking: base price x passengers x cabin multiplier"""
+    return round(base_price * passengers * _CABIN_MULTIPLIER[cabin_class], 2)
+
+
 def search_flights(
     origin: Literal["NYC", "LAX", "LON", "PAR", "TYO"],
     destination: Literal["NYC", "LAX", "LON", "PAR", "TYO"],
@@ -64,26 +193,37 @@ def search_flights(
     Returns:
         JSON string with available flights
     """
-    if origin == destination:
-        return json.dumps({"error": "Origin and destination cannot be the same"})
+    origin_code, destination_code = origin.upper(), destination.upper()
+    if origin_code == destination_code:
+        return _ERR_SAME_CITY
+    
+    key = (origin_code, destination_code, departure_date)
+    version = _DATA_VERSION
+    cached = _search_cache_get(key)
+    if cached is not None:
+        return cached
     
-    route = f"{origin}-{destination}"
+    route = f"{origin_code}-{destination_code}"
     flights = FLIGHTS_DB.get(route, [])
     
     if not flights:
-        return json.dumps({
-            "error": f"No flights available for route {origin} to {destination}",
+        out = json.dumps({
+            "error": f"No flights available for route {origin_code} to {destination_code}",
             "suggestion": "Try a different route or check connecting flights"
         })
+        _search_cache_put(key, out, _SEARCH_NEGATIVE_TTL, version)
+        return out
     
     result = {
-        "route": f"{origin} → {destination}",
+        "route": f"{origin_code} → {destination_code}",
         "date": departure_date,
         "flights": flights,
         "count": len(flights)
     }
     
-    return json.dumps(result, indent=2)
+    out = _dump(result)
+    _search_cache_put(key, out, _SEARCH_TTL, version)
+    return out
 
 
 def check_flight_availability(
@@ -99,29 +239,29 @@ def check_flight_availability(
     Returns:
         JSON string with availability status
     """
-    if passengers < 1 or passengers > 9:
-        return json.dumps({"error": "Passengers must be between 1 and 9"})
-    
-    # Search for flight in database
-    for route, flights in FLIGHTS_DB.items():
-        for flight in flights:
-            if flight["id"] == flight_id:
-                available = flight["seats"]
-                is_available = available >= passengers
-                
-                return json.dumps({
-                    "flight_id": flight_id,
-                    "route": route,
-                    "passengers_requested": passengers,
-                    "seats_available": available,
-                    "can_book": is_available,
-                    "price_per_person": flight["price"],
-                    "total_price": flight["price"] * passengers if is_available else None,
-                    "departure": flight["departure"],
-                    "arrival": flight["arrival"]
-                }, indent=2)
-    
-    return json.dumps({"error": f"Flight {flight_id} not found"})
+    if not 1 <= passengers <= 9:
+        return _ERR_INVALID_PAX
+    
+    # Look up flight in database (malformed IDs can never match)
+    entry = FLIGHT_INDEX.get(flight_id) if _FLIGHT_ID_RE.fullmatch(flight_id) else None
+    if entry is None:
+        return json.dumps({"error": f"Flight {flight_id} not found"})
+    
+    route, flight = entry
+    available = flight["seats"]
+    is_available = available >= passengers
+    
+    return _dump({
+        "flight_id": flight_id,
+        "route": route,
+        "passengers_requested": passengers,
+        "seats_available": available,
+        "can_book": is_available,
+        "price_per_person": flight["price"],
+        "total_price": flight["price"] * passengers if is_available else None,
+        "departure": flight["departure"],
+        "arrival": flight["arrival"]
+    })
 
 
 def book_flight(
@@ -135,7 +275,7 @@ def book_flight(
     
     Args:
         flight_id: The flight number (e.g., "BA001")
-        passengers: Number of passengers (must be integer)
+        passengers: Number of passengers (must be integer between 1-9)
         cabin_class: Cabin class for the booking
         passenger_name: Lead passenger full name
         passenger_email: Contact email for booking confirmation
@@ -145,57 +285,59 @@ def book_flight(
     """
     global BOOKING_COUNTER
     
+    if not 1 <= passengers <= 9:
+        return _ERR_INVALID_PAX
+    
     # Validate email format (basic check)
     if "@" not in passenger_email or "." not in passenger_email:
-        return json.dumps({"error": "Invalid email format"})
-    
-    # Find the flight
-    for route, flights in FLIGHTS_DB.items():
-        for flight in flights:
-            if flight["id"] == flight_id:
-                if flight["seats"] < passengers:
-                    return json.dumps({
-                        "error": "Insufficient seats available",
-                        "requested": passengers,
-                        "available": flight["seats"]
-                    })
-                
-                # Calculate price (cabin class multiplier)
-                base_price = flight["price"]
-                multiplier = {"economy": 1.0, "business": 2.5, "first": 4.0}[cabin_class]
-                total_price = base_price * passengers * multiplier
-                
-                # Create booking
-                booking_id = f"BK{BOOKING_COUNTER}"
-                BOOKING_COUNTER += 1
-                
-                booking = {
-                    "booking_id": booking_id,
-                    "flight_id": flight_id,
-                    "route": route,
-                    "passengers": passengers,
-                    "cabin_class": cabin_class,
-                    "passenger_name": passenger_name,
-                    "passenger_email": passenger_email,
-                    "total_price": round(total_price, 2),
-                    "departure": flight["departure"],
-                    "arrival": flight["arrival"],
-                    "status": "CONFIRMED",
-                    "booking_date": datetime.now().isoformat()
-                }
-                
-                BOOKINGS[booking_id] = booking
-                
-                # Update available seats
-                flight["seats"] -= passengers
-                
-                return json.dumps({
-                    "success": True,
-                    "message": "Flight booked successfully!",
-                    "booking": booking
-                }, indent=2)
-    
-    return json.dumps({"error": f"Flight {flight_id} not found"})
+        return _ERR_INVALID_EMAIL
+    
+    # Find the flight (malformed IDs can never match)
+    entry = FLIGHT_INDEX.get(flight_id) if _FLIGHT_ID_RE.fullmatch(flight_id) else None
+    if entry is None:
+        return json.dumps({"error": f"Flight {flight_id} not found"})
+    
+    route, flight = entry
+    if flight["seats"] < passengers:
+        return json.dumps({
+            "error": "Insufficient seats available",
+            "requested": passengers,
+            "available": flight["seats"]
+        })
+    
+    # Calculate price (cabin class multiplier)
+    total_price = _booking_total(flight["price"], passengers, cabin_class)
+    
+    # Create booking
+    booking_id = f"BK{BOOKING_COUNTER}"
+    BOOKING_COUNTER += 1
+    
+    booking = Booking(
+        booking_id=booking_id,
+        flight_id=flight_id,
+        route=route,
+        passengers=passengers,
+        cabin_class=cabin_class,
+        passenger_name=passenger_name,
+        passenger_email=passenger_email,
+        total_price=total_price,
+        departure=flight["departure"],
+        arrival=flight["arrival"],
+        status="CONFIRMED",
+        booking_date=datetime.now().isoformat(timespec="seconds")
+    )
+    
+    BOOKINGS[booking_id] = booking
+    
+    # Update available seats
+    flight["seats"] -= passengers
+    _invalidate_caches(route)
+    
+    return _dump({
+        "success": True,
+        "message": "Flight booked successfully!",
+        "booking": booking.to_dict()
+    })
 
 
 def cancel_booking(
@@ -211,40 +353,36 @@ def cancel_booking(
     Returns:
         JSON string with cancellation confirmation
     """
-    if booking_id not in BOOKINGS:
+    booking = BOOKINGS.get(booking_id)
+    if booking is None:
         return json.dumps({"error": f"Booking {booking_id} not found"})
     
-    booking = BOOKINGS[booking_id]
-    
     # Verify email
-    if booking["passenger_email"] != passenger_email:
-        return json.dumps({"error": "Email does not match booking records"})
+    if booking.passenger_email != passenger_email:
+        return _ERR_EMAIL_MISMATCH
     
-    if booking["status"] == "CANCELLED":
-        return json.dumps({"error": "Booking already cancelled"})
+    if booking.status == "CANCELLED":
+        return _ERR_ALREADY_CANCELLED
     
     # Return seats to inventory
-    flight_id = booking["flight_id"]
-    for route, flights in FLIGHTS_DB.items():
-        for flight in flights:
-            if flight["id"] == flight_id:
-                flight["seats"] += booking["passengers"]
+    FLIGHT_INDEX[booking.flight_id][1]["seats"] += booking.passengers
+    _invalidate_caches(booking.route)
     
     # Update booking status
-    booking["status"] = "CANCELLED"
-    booking["cancellation_date"] = datetime.now().isoformat()
+    booking.status = "CANCELLED"
+    booking.cancellation_date = datetime.now().isoformat(timespec="seconds")
     
     # Calculate refund (90% refund)
-    refund_amount = booking["total_price"] * 0.9
+    refund_amount = booking.total_price * 0.9
     
-    return json.dumps({
+    return _dump({
         "success": True,
         "message": "Booking cancelled successfully",
         "booking_id": booking_id,
         "refund_amount": round(refund_amount, 2),
-        "original_amount": booking["total_price"],
-        "cancellation_fee": round(booking["total_price"] * 0.1, 2)
-    }, indent=2)
+        "original_amount": booking.total_price,
+        "cancellation_fee": round(booking.total_price * 0.1, 2)
+    })
 
 
 def view_booking(
@@ -258,28 +396,431 @@ def view_booking(
     Returns:
         JSON string with booking details
     """
-    if booking_id not in BOOKINGS:
+    booking = BOOKINGS.get(booking_id)
+    if booking is None:
         return json.dumps({"error": f"Booking {booking_id} not found"})
     
-    return json.dumps(BOOKINGS[booking_id], indent=2)
+    return _dump(booking.to_dict())
 
 
 # ============================================================================
 # BIND TOOLS TO MODEL
 # ============================================================================
 
-tools = [search_flights, check_flight_availability, book_flight, cancel_booking, view_booking]
+tools: list[Callable[..., str]] = [search_flights, check_flight_availability, book_flight, cancel_booking, view_booking]
+TOOL_REGISTRY: dict[str, Callable[..., str]] = {t.__name__: t for t in tools}
+
+
+def _args_model(func: Callable[..., str]) -> type[BaseModel]:
+    """Pydantic model of a tool's parameters, built from its signature"""
+    fields: dict[str, Any] = {
+        name: (param.annotation, ... if param.default is param.empty else param.default)
+        for name, param in inspect.signature(func).parameters.items()
+    }
+    return create_model(
+        f"{func.__name__}_args",
+        # Strict like the bound schemas: no "2" -> 2 or True -> 1 coercion
+        __config__=ConfigDict(extra="forbid", strict=True),
+        **fields,
+    )
+
+
+# Argument models, checked locally before a tool runs
+TOOL_MODELS: dict[str, type[BaseModel]] = {name: _args_model(t) for name, t in TOOL_REGISTRY.items()}
 
 model_with_tools = model.bind_tools(
     tools,
     strict=True,  # Enforce type safety
 )
 
+# Read-only tools whose results can be reused for identical calls
+CACHEABLE_TOOLS = frozenset({"search_flights", "check_flight_availability", "view_booking"})
+
+# Read-only tools memoized in _TOOL_CACHE; search_flights is left to its own
+# TTL cache
+_MEMOIZED_TOOLS = CACHEABLE_TOOLS - {"search_flights"}
+
+
+def _dispatch(tool_name: str, tool_args: dict) -> str:
+    """Run a tool call, reusing the result of an identical read-only call.
+    
+    Unknown tools and arguments that fail the tool's TOOL_MODELS check are
+    not run; they get an error result Claude can correct from.
+    """
+    if tool_name not in TOOL_MODELS:
+        return json.dumps({"error": f"Unknown tool {tool_name}"})
+    try:
+        tool_args = TOOL_MODELS[tool_name].model_validate(tool_args).model_dump()
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(map(str, err['loc'])) or 'args'}: {err['msg']}" for err in e.errors()
+        )
+        return json.dumps({"error": f"Invalid arguments for {tool_name}: {problems}"})
+    
+    if tool_name not in _MEMOIZED_TOOLS:
+        return TOOL_REGISTRY[tool_name](**tool_args)
+    
+    key = (tool_name, json.dumps(tool_args, sort_keys=True, default=str))
+    cached = _TOOL_CACHE.get(key)
+    if cached is not None:
+        return cached
+    version = _DATA_VERSION
+    result = TOOL_REGISTRY[tool_name](**tool_args)
+    with _CACHE_LOCK:
+        if version == _DATA_VERSION:
+            if len(_TOOL_CACHE) >= _TOOL_CACHE_MAXSIZE:
+                _TOOL_CACHE.pop(next(iter(_TOOL_CACHE)), None)
+            _TOOL_CACHE[key] = result
+    return result
+
 # ============================================================================
 # BOOKING ASSISTANT
 # ============================================================================
 
-def run_booking_assistant(user_message: str, conversation_history: list = None):
+SYSTEM_PROMPT = """You are a helpful flight booking assistant. You can:
+1. Search for flights between cities
+2. Check flight availability
+3. Book flights for passengers
+4. Cancel existing bookings
+5. View booking details
+
+Always confirm important details before booking. Be clear about prices and policies.
+Use tools to help users with their booking needs."""
+
+
+def reset_conversation() -> list[dict]:
+    """Start a new conversation, seeded with the system message"""
+    return [{
+        "role": "system",
+        "content": [{
+            "type": "text",
+            "text": SYSTEM_PROMPT,
+            # Tools + system prompt are identical on every call; cache them
+            "cache_control": {"type": "ephemeral"},
+        }]
+    }]
+
+
+# Requests simple enough to map straight onto one tool call, skipping the
+# model: (pattern the whole message must match, tool, args from the match)
+_FAST_ROUTES = [
+    (
+        re.compile(
+            r"\s*show\s+(?:me\s+)?(?:the\s+)?(?:details\s+(?:for|of)\s+)?"
+            r"booking\s+(BK\d+)\s*[.!?]?\s*",
+            re.IGNORECASE,
+        ),
+        "view_booking",
+        lambda m: {"booking_id": m.group(1).upper()},
+    ),
+    (
+        re.compile(
+            r"\s*cancel\s+booking\s+(BK\d+)\s+for\s+"
+            r"([\w.+-]+@[\w-]+(?:\.[\w-]+)+)\s*[.!?]?\s*",
+            re.IGNORECASE,
+        ),
+        "cancel_booking",
+        lambda m: {"booking_id": m.group(1).upper(), "passenger_email": m.group(2)},
+    ),
+]
+
+
+def _fast_route(user_message: str) -> Optional[tuple[str, dict]]:
+    """(tool name, args) if the message can skip the model, else None"""
+    for pattern, tool_name, build_args in _FAST_ROUTES:
+        m = pattern.fullmatch(user_message)
+        if m:
+            return tool_name, build_args(m)
+    return None
+
+
+# Anthropic allows 4 prompt-cache breakpoints per request; the system prompt
+# uses one, the rest rotate through the most recent tool results
+_MAX_HISTORY_BREAKPOINTS = 3
+
+
+def _set_cache_breakpoint(conversation_history: list[dict], block: dict) -> None:
+    """Mark a content block as a cache breakpoint, dropping the oldest marks"""
+    block["cache_control"] = {"type": "ephemeral"}
+    marked = [
+        b
+        for message in conversation_history[1:]
+        if isinstance(message["content"], list)
+        for b in message["content"]
+        if isinstance(b, dict) and "cache_control" in b
+    ]
+    for b in marked[:-_MAX_HISTORY_BREAKPOINTS]:
+        del b["cache_control"]
+
+
+# Rough request size budget for the conversation, estimated from its length;
+# past it, everything before the most recent turns is folded into a summary
+_HISTORY_TOKEN_LIMIT = 8000
+_CHARS_PER_TOKEN = 4
+_KEEP_RECENT_TURNS = 2
+# Bounds on what the summary carries over, so it stays small however long
+# the conversation gets
+_SUMMARY_MAX_REQUESTS = 10
+_SUMMARY_REQUEST_CHARS = 200
+_SUMMARY_MAX_IDS = 20
+_SUMMARY_PREFIX = "[Summary of prior turns]"
+# Within a turn that is over the limit by itself, the last few tool
+# call/result steps stay intact and earlier ones become one summary line each
+_KEEP_RECENT_STEPS = 2
+_SUMMARY_MAX_STEPS = 10
+_STEP_RESULT_CHARS = 300
+_STEPS_PREFIX = "[Summary of earlier tool calls this turn]"
+_BOOKING_ID_RE = re.compile(r"\bBK\d+\b")
+
+
+def _estimate_tokens(conversation_history: list[dict]) -> int:
+    """Approximate token count of a conversation"""
+    return sum(len(str(message["content"])) for message in conversation_history) // _CHARS_PER_TOKEN
+
+
+def _is_summary(message: dict, prefix: str = _SUMMARY_PREFIX) -> bool:
+    content = message["content"]
+    return (
+        message["role"] == "user"
+        and isinstance(content, list)
+        and content[0].get("text", "").startswith(prefix)
+    )
+
+
+def _summarize(messages: list[dict]) -> str:
+    """Deterministic summary of earlier turns: requests, bookings and flights"""
+    requests = []
+    booking_ids = {}
+    flight_ids = {}
+    for message in messages:
+        content = message["content"]
+        if message["role"] == "user" and isinstance(content, str):
+            requests.append(_truncate(" ".join(content.split()), _SUMMARY_REQUEST_CHARS))
+        elif _is_summary(message):
+            requests.extend(
+                line[2:] for line in content[0]["text"].splitlines() if line.startswith("- ")
+            )
+        text = str(content)
+        booking_ids.update(dict.fromkeys(_BOOKING_ID_RE.findall(text)))
+        flight_ids.update(dict.fromkeys(_FLIGHT_ID_RE.findall(text)))
+    
+    lines = [_SUMMARY_PREFIX, "Earlier requests (most recent last):"]
+    lines.extend(f"- {request}" for request in requests[-_SUMMARY_MAX_REQUESTS:])
+    lines.append(f"Bookings referenced: {', '.join(list(booking_ids)[-_SUMMARY_MAX_IDS:]) or 'none'}")
+    lines.append(f"Flights referenced: {', '.join(list(flight_ids)[-_SUMMARY_MAX_IDS:]) or 'none'}")
+    return "\n".join(lines)
+
+
+def _summarize_steps(messages: list[dict]) -> str:
+    """Summary of tool steps: one line per call with its truncated result"""
+    calls = {}
+    lines = []
+    for message in messages:
+        content = message["content"]
+        if _is_summary(message, _STEPS_PREFIX):
+            lines.extend(content[0]["text"].splitlines()[1:])
+            continue
+        if not isinstance(content, list):
+            continue
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            if block.get("type") == "tool_use":
+                args = block.get("input") or block.get("partial_json") or {}
+                calls[block["id"]] = f"{block['name']}({args if isinstance(args, str) else json.dumps(args)})"
+            elif block.get("type") == "tool_result":
+                result = _truncate(" ".join(str(block["content"]).split()), _STEP_RESULT_CHARS)
+                lines.append(f"- {calls.get(block['tool_use_id'], 'tool call')} -> {result}")
+    return "\n".join([_STEPS_PREFIX, *lines[-_SUMMARY_MAX_STEPS:]])
+
+
+def _compact_history(conversation_history: list[dict]) -> None:
+    """Keep the request under _HISTORY_TOKEN_LIMIT by summarizing older messages.
+    
+    No-op while the conversation is under the limit. Otherwise everything
+    before the most recent turns is replaced with a summary (see
+    _fold_turns); if the current turn alone is still over the limit, its
+    older tool steps are summarized too (see _fold_steps). Each summary is
+    bounded, so a request stays roughly within the limit however many turns
+    or tool iterations came before it.
+    """
+    if _estimate_tokens(conversation_history) <= _HISTORY_TOKEN_LIMIT:
+        return
+    _fold_turns(conversation_history)
+    if _estimate_tokens(conversation_history) > _HISTORY_TOKEN_LIMIT:
+        _fold_steps(conversation_history)
+
+
+def _fold_turns(conversation_history: list[dict]) -> None:
+    """Replace all but the system prompt and the most recent turns with a summary.
+    
+    Turns start at a plain user message, so tool_use/tool_result pairs are
+    never split. Keeps as many of the last _KEEP_RECENT_TURNS turns as fit in
+    half the limit (always the current one), so compaction is not due again
+    on the next call.
+    """
+    turn_starts = [
+        i for i, message in enumerate(conversation_history)
+        if message["role"] == "user" and isinstance(message["content"], str)
+    ]
+    compacted = None
+    for keep_from in turn_starts[-_KEEP_RECENT_TURNS:]:
+        older = conversation_history[1:keep_from]
+        if not older or (len(older) == 1 and _is_summary(older[0])):
+            continue  # nothing new to fold in
+        summary_block = {"type": "text", "text": _summarize(older)}
+        compacted = [
+            conversation_history[0],
+            {"role": "user", "content": [summary_block]},
+            *conversation_history[keep_from:],
+        ]
+        if _estimate_tokens(compacted) <= _HISTORY_TOKEN_LIMIT // 2:
+            break
+    if compacted is None:
+        return
+    conversation_history[:] = compacted
+    _set_cache_breakpoint(conversation_history, summary_block)
+
+
+def _fold_steps(conversation_history: list[dict]) -> None:
+    """Summarize the current turn's tool steps before the last _KEEP_RECENT_STEPS.
+    
+    A step is an assistant tool_use message and the user tool_result message
+    answering it; the summary replaces whole steps (and any earlier step
+    summary) right after the turn's request, so pairs are never split.
+    """
+    turn_start = max(
+        (i for i, message in enumerate(conversation_history)
+         if message["role"] == "user" and isinstance(message["content"], str)),
+        default=None,
+    )
+    if turn_start is None:
+        return
+    first_step = turn_start + 1
+    if first_step < len(conversation_history) and _is_summary(conversation_history[first_step], _STEPS_PREFIX):
+        first_step += 1
+    keep_from = len(conversation_history) - 2 * _KEEP_RECENT_STEPS
+    if keep_from <= first_step or conversation_history[keep_from]["role"] != "assistant":
+        return  # nothing new to fold in, or the turn does not end on a complete step
+    summary_block = {"type": "text", "text": _summarize_steps(conversation_history[turn_start + 1:keep_from])}
+    conversation_history[turn_start + 1:keep_from] = [{"role": "user", "content": [summary_block]}]
+    _set_cache_breakpoint(conversation_history, summary_block)
+
+
+async def _run_tool_calls(tool_calls: list[ToolCall]) -> list[str]:
+    """Execute a turn's tool calls, returning results in call order.
+    
+    Read-only calls run concurrently in worker threads; a turn that books or
+    cancels anything runs sequentially so side effects keep their order.
+    """
+    if all(tool_call["name"] in CACHEABLE_TOOLS for tool_call in tool_calls):
+        return await asyncio.gather(*(
+            asyncio.to_thread(_dispatch, tool_call["name"], tool_call["args"])
+            for tool_call in tool_calls
+        ))
+    return [_dispatch(tool_call["name"], tool_call["args"]) for tool_call in tool_calls]
+
+
+def _start_tool_calls(tool_call_chunks: list[ToolCallChunk], started: dict[str, asyncio.Task]) -> bool:
+    """Start fully streamed read-only tool calls not yet in `started`.
+    
+    Returns False once a call that cannot start early is reached (a booking,
+    a cancellation, or a missing id or unparsable args); later calls then
+    wait for the stream to end so they keep their order relative to it.
+    """
+    for tool_call_chunk in tool_call_chunks[len(started):]:
+        tool_call_id = tool_call_chunk["id"]
+        if tool_call_id is None or tool_call_chunk["name"] not in CACHEABLE_TOOLS:
+            return False
+        try:
+            args = json.loads(tool_call_chunk["args"] or "{}")
+        except json.JSONDecodeError:
+            return False
+        started[tool_call_id] = asyncio.create_task(
+            asyncio.to_thread(_dispatch, tool_call_chunk["name"], args)
+        )
+    return True
+
+
+def _moved_past(response: AIMessageChunk, tool_call_chunk: ToolCallChunk) -> bool:
+    """Whether the stream has reached a content block after the tool call's"""
+    index = tool_call_chunk["index"]
+    if index is None or not isinstance(response.content, list):
+        return False
+    return any(
+        isinstance(block, dict) and block.get("index", -1) > index
+        for block in response.content
+    )
+
+
+async def _stream_response(
+    conversation_history: list[dict],
+) -> tuple[Optional[AIMessageChunk], dict[str, asyncio.Task]]:
+    """Stream Claude's reply, starting read-only tool calls while it is generated.
+    
+    A tool call is complete once the stream has moved on to a later content
+    block (another tool call or text). Returns the merged message (None if the stream was empty) and
+    {tool_call_id: task} for the calls started early.
+    """
+    response: Optional[AIMessageChunk] = None
+    started: dict[str, asyncio.Task] = {}
+    dispatching = True
+    async for chunk in model_with_tools.astream(conversation_history):
+        response = cast(AIMessageChunk, chunk if response is None else response + chunk)
+        if dispatching:
+            tool_call_chunks = response.tool_call_chunks
+            if tool_call_chunks and not _moved_past(response, tool_call_chunks[-1]):
+                tool_call_chunks = tool_call_chunks[:-1]
+            dispatching = _start_tool_calls(tool_call_chunks, started)
+    if dispatching and response is not None:
+        _start_tool_calls(response.tool_call_chunks, started)
+    return response, started
+
+
+def _response_text(content: str | list) -> str:
+    """Plain text of message content (a string or a list of content blocks)"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "")
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+async def _collect_tool_results(
+    tool_calls: list[ToolCall], started: dict[str, asyncio.Task]
+) -> list[str]:
+    """Results for a turn's tool calls, in call order"""
+    early = {tool_call_id: await task for tool_call_id, task in started.items()}
+    pending = [tool_call for tool_call in tool_calls if tool_call["id"] not in early]
+    late = iter(await _run_tool_calls(pending)) if pending else iter(())
+    return [
+        early[tool_call["id"]] if tool_call["id"] in early else next(late)
+        for tool_call in tool_calls
+    ]
+
+
+_RULE = "=" * 70
+
+
+def _truncate(s: str, n: int = 200) -> str:
+    """`s` cut to `n` characters, marked with "..." if anything was dropped"""
+    return s if len(s) <= n else s[:n] + "..."
+
+
+def _render_tool_call(tool_name: str, tool_args: dict, result: str) -> str:
+    """One log record describing a tool call and its (truncated) result"""
+    return (
+        f"\n   Tool: {tool_name}"
+        f"\n   Args: {json.dumps(tool_args, indent=6)}"
+        f"\n\n   Result: {_truncate(result)}"
+    )
+
+
+async def run_booking_assistant_async(
+    user_message: str, conversation_history: Optional[list[dict]] = None
+) -> tuple[str, list[dict]]:
     """
     Run the booking assistant with tool calling capability.
     Handles multi-turn conversations and tool execution.
@@ -289,19 +830,20 @@ def run_booking_assistant(user_message: str, conversation_history: list = None):
     
     # Add system message at the start
     if not conversation_history:
-        system_msg = {
-            "role": "system",
-            "content": """You are a helpful flight booking assistant. You can:
-1. Search for flights between cities
-2. Check flight availability
-3. Book flights for passengers
-4. Cancel existing bookings
-5. View booking details
-
-Always confirm important details before booking. Be clear about prices and policies.
-Use tools to help users with their booking needs."""
-        }
-        conversation_history.append(system_msg)
+        conversation_history.extend(reset_conversation())
+    
+    # Answer direct lookups/cancellations without calling the model
+    route = _fast_route(user_message)
+    if route is not None:
+        tool_name, tool_args = route
+        result = _dispatch(tool_name, tool_args)
+        conversation_history.append({"role": "user", "content": user_message})
+        conversation_history.append({"role": "assistant", "content": result})
+        LOG.info("\n%s\nUSER: %s\n%s", _RULE, user_message, _RULE)
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info(_render_tool_call(tool_name, tool_args, result))
+        LOG.info("\n%s\n", _RULE)
+        return result, conversation_history
     
     # Add user message
     conversation_history.append({
@@ -309,19 +851,37 @@ Use tools to help users with their booking needs."""
         "content": user_message
     })
     
-    print(f"\n{'='*70}")
-    print(f"USER: {user_message}")
-    print(f"{'='*70}")
+    LOG.info("\n%s\nUSER: %s\n%s", _RULE, user_message, _RULE)
     
     # Maximum iterations to prevent infinite loops
     max_iterations = 10
     iteration = 0
+    last_tool_signature = None
     
     while iteration < max_iterations:
         iteration += 1
         
-        # Get response from Claude
-        response = model_with_tools.invoke(conversation_history)
+        # Keep the request size bounded as the conversation grows
+        _compact_history(conversation_history)
+        
+        # Get response from Claude (read-only tools may already be running)
+        response, started = await _stream_response(conversation_history)
+        if response is None:
+            LOG.info("\n⚠️  Empty response from Claude. Ending conversation.")
+            return "I apologize, but I didn't get a response. Please try again.", conversation_history
+        
+        # Claude asking for exactly the same tool calls again won't make progress
+        tool_signature = tuple(
+            (tool_call["name"], json.dumps(tool_call["args"], sort_keys=True))
+            for tool_call in response.tool_calls
+        )
+        if tool_signature and tool_signature == last_tool_signature:
+            # Read-only calls already started from the stream: let them finish
+            # (threads can't be cancelled) and discard their results
+            await asyncio.gather(*started.values(), return_exceptions=True)
+            LOG.info("\n⚠️  Repeated identical tool calls. Ending conversation.")
+            return "I apologize, but I'm stuck repeating the same step. Please rephrase your request.", conversation_history
+        last_tool_signature = tool_signature
         
         # Add response to history
         conversation_history.append({
@@ -331,74 +891,109 @@ Use tools to help users with their booking needs."""
         
         # Check if Claude wants to use tools
         if response.tool_calls:
-            print(f"\n🔧 CLAUDE IS USING TOOLS:")
+            LOG.info("\n🔧 CLAUDE IS USING TOOLS:")
             
-            # Execute each tool call
-            tool_results = []
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
-                
-                print(f"\n   Tool: {tool_name}")
-                print(f"   Args: {json.dumps(tool_args, indent=6)}")
-                
-                # Execute the tool
-                tool_function = {
-                    "search_flights": search_flights,
-                    "check_flight_availability": check_flight_availability,
-                    "book_flight": book_flight,
-                    "cancel_booking": cancel_booking,
-                    "view_booking": view_booking,
-                }[tool_name]
-                
-                result = tool_function(**tool_args)
-                
-                print(f"\n   Result: {result[:200]}..." if len(result) > 200 else f"\n   Result: {result}")
-                
-                # Add tool result to history
-                tool_results.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_call["id"],
-                            "content": result
-                        }
-                    ]
-                })
+            # Execute the tool calls
+            results = await _collect_tool_results(response.tool_calls, started)
             
-            # Add all tool results to history
-            for tool_result in tool_results:
-                conversation_history.append(tool_result)
+            if LOG.isEnabledFor(logging.INFO):
+                for tool_call, result in zip(response.tool_calls, results):
+                    LOG.info(_render_tool_call(tool_call["name"], tool_call["args"], result))
+            
+            # Add all tool results to history as one message
+            conversation_history.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_call["id"],
+                        "content": result
+                    }
+                    for tool_call, result in zip(response.tool_calls, results)
+                ]
+            })
+            
+            # Let the next call reuse the cached prefix up to these results
+            _set_cache_breakpoint(conversation_history, conversation_history[-1]["content"][-1])
             
             # Continue loop to get Claude's response to tool results
             continue
         
         else:
             # No more tool calls, Claude has final response
-            print(f"\n💬 CLAUDE: {response.content}")
-            print(f"\n{'='*70}\n")
-            return response.content, conversation_history
+            final_text = _response_text(response.content)
+            LOG.info("\n💬 CLAUDE: %s\n\n%s\n", final_text, _RULE)
+            return final_text, conversation_history
     
-    print(f"\n⚠️  Maximum iterations reached. Ending conversation.")
+    LOG.info("\n⚠️  Maximum iterations reached. Ending conversation.")
     return "I apologize, but I need to end this conversation. Please start a new booking.", conversation_history
 
 
+# One event loop for every synchronous call. The model's async HTTP client is
+# created once and keeps connections bound to the loop that opened them, so a
+# fresh loop per call (asyncio.run) would reuse sockets of a closed loop.
+_RUNNER = asyncio.Runner()
+atexit.register(_RUNNER.close)
+
+
+def run_booking_assistant(
+    user_message: str, conversation_history: Optional[list[dict]] = None
+) -> tuple[str, list[dict]]:
+    """Synchronous entry point; runs run_booking_assistant_async to completion.
+    
+    All calls share one event loop, so call it from one thread at a time and
+    not from inside a running loop (await run_booking_assistant_async there).
+    """
+    return _RUNNER.run(run_booking_assistant_async(user_message, conversation_history))
+
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+# Conversation per user, for serving many users from one event loop. Turns of
+# the same user are serialized by that user's lock; different users proceed
+# concurrently; shared caches guard against cross-session races (see _CACHE_LOCK).
+# A lock lives as long as a turn holds or waits on it, then drops out by itself.
+SESSIONS: dict[str, list[dict]] = {}
+SESSION_LOCKS: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+async def run_session_turn(user_id: str, user_message: str) -> str:
+    """Handle one message in `user_id`'s session, returning the reply"""
+    async with SESSION_LOCKS.setdefault(user_id, asyncio.Lock()):
+        conversation = SESSIONS.setdefault(user_id, reset_conversation())
+        response, _ = await run_booking_assistant_async(user_message, conversation)
+        return response
+
+
+def end_session(user_id: str) -> None:
+    """Forget a user's conversation"""
+    SESSIONS.pop(user_id, None)
+
+
 # ============================================================================
 # EXAMPLE USAGE / DEMO
 # ============================================================================
 
 if __name__ == "__main__":
+    # Same stream as the demo's print() banners, so the trace can be redirected with them
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    LOG.addHandler(handler)
+    LOG.setLevel(logging.INFO)
+    
     print("\n" + "="*70)
     print("✈️  FLIGHT BOOKING SYSTEM - DEMO")
     print("="*70)
     
+    # Examples 1-3 are one customer's session; keep the same conversation
+    conversation = reset_conversation()
+    
     # Example 1: Search and Book
     print("\n\n📌 EXAMPLE 1: Search and Book a Flight")
     print("-" * 70)
     
-    conversation = []
-    
     # Step 1: Search
     response, conversation = run_booking_assistant(
         "I want to fly from NYC to Tokyo on 2025-02-15. Show me available flights.",
@@ -422,8 +1017,9 @@ if __name__ == "__main__":
     print("\n\n📌 EXAMPLE 2: View Booking")
     print("-" * 70)
     
-    response, _ = run_booking_assistant(
-        "Show me details for booking BK1000"
+    response, conversation = run_booking_assistant(
+        "Show me details for booking BK1000",
+        conversation
     )
     
     
@@ -431,8 +1027,9 @@ if __name__ == "__main__":
     print("\n\n📌 EXAMPLE 3: Cancel Booking")
     print("-" * 70)
     
-    response, _ = run_booking_assistant(
-        "Cancel booking BK1000 for john@email.com"
+    response, conversation = run_booking_assistant(
+        "Cancel booking BK1000 for john@email.com",
+        conversation
     )
     
     
@@ -440,14 +1037,17 @@ if __name__ == "__main__":
     print("\n\n📌 EXAMPLE 4: Complex Multi-Step Query")
     print("-" * 70)
     
-    response, _ = run_booking_assistant(
+    # A different customer: start over from the system message
+    conversation = reset_conversation()
+    response, conversation = run_booking_assistant(
         "I need to book a flight from LAX to Tokyo for 3 people in economy class on March 1st. "
         "My name is Sarah Johnson and email is sarah.j@email.com. "
-        "Please search for flights and book the cheapest option if available."
+        "Please search for flights and book the cheapest option if available.",
+        conversation
     )
     
     print("\n\n✅ DEMO COMPLETE!")
     print("\n📊 FINAL DATABASE STATE:")
     print(f"\nTotal Bookings: {len(BOOKINGS)}")
-    print(f"Active Bookings: {sum(1 for b in BOOKINGS.values() if b['status'] == 'CONFIRMED')}")
-    print(f"Cancelled Bookings: {sum(1 for b in BOOKINGS.values() if b['status'] == 'CANCELLED')}")
\ No newline at end of file
+    print(f"Active Bookings: {sum(1 for b in BOOKINGS.values() if b.status == 'CONFIRMED')}")
+    print(f"Cancelled Bookings: {sum(1 for b in BOOKINGS.values() if b.status == 'CANCELLED')}")
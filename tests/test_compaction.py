@@ -0,0 +1,94 @@
+import os
+import unittest
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+import main
+
+
+def _tool_step(history, step_id, result_chars):
+    history.append({"role": "assistant", "content": [
+        {"type": "text", "text": "Let me look that up."},
+        {"type": "tool_use", "id": step_id, "name": "search_flights",
+         "input": {"origin": "NYC", "destination": "TYO", "departure_date": "2025-02-15"}},
+    ]})
+    history.append({"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": step_id, "content": "x" * result_chars + " JL005"},
+    ]})
+
+
+def _assert_pairs_intact(test, history):
+    for i, message in enumerate(history):
+        content = message["content"]
+        if not isinstance(content, list):
+            continue
+        result_ids = [b["tool_use_id"] for b in content if b.get("type") == "tool_result"]
+        if not result_ids:
+            continue
+        previous = history[i - 1]
+        test.assertEqual(previous["role"], "assistant")
+        use_ids = [b["id"] for b in previous["content"] if b.get("type") == "tool_use"]
+        test.assertEqual(result_ids, use_ids)
+    for i, message in enumerate(history):
+        if message["role"] == "assistant" and isinstance(message["content"], list):
+            use_ids = [b["id"] for b in message["content"] if b.get("type") == "tool_use"]
+            if use_ids and i + 1 < len(history):
+                test.assertEqual(history[i + 1]["role"], "user")
+
+
+def _summaries(history, prefix):
+    return [m for m in history if main._is_summary(m, prefix)]
+
+
+class CompactHistoryTest(unittest.TestCase):
+    def test_many_turns_stay_bounded(self):
+        history = main.reset_conversation()
+        for turn in range(40):
+            history.append({"role": "user", "content": f"request {turn} " + "y" * 2000})
+            main._compact_history(history)
+            self.assertLessEqual(main._estimate_tokens(history), main._HISTORY_TOKEN_LIMIT)
+            _tool_step(history, f"t{turn}", 2000)
+            main._compact_history(history)
+            self.assertLessEqual(main._estimate_tokens(history), main._HISTORY_TOKEN_LIMIT)
+            history.append({"role": "assistant", "content": f"answer {turn}"})
+            _assert_pairs_intact(self, history)
+        self.assertIs(history[0]["role"], "system")
+
+    def test_repeated_folds_absorb_the_previous_summary(self):
+        history = main.reset_conversation()
+        for turn in range(12):
+            history.append({"role": "user", "content": f"request {turn} " + "y" * 6000})
+            history.append({"role": "assistant", "content": f"answer {turn} about BK{1000 + turn}"})
+            main._compact_history(history)
+        summaries = _summaries(history, main._SUMMARY_PREFIX)
+        self.assertEqual(len(summaries), 1)
+        text = summaries[0]["content"][0]["text"]
+        # Requests and bookings from before the last fold are carried over
+        self.assertIn("request 1 ", text)
+        self.assertIn("BK1001", text)
+        self.assertLessEqual(text.count("\n- "), main._SUMMARY_MAX_REQUESTS)
+
+    def test_long_tool_loop_in_one_turn_stays_bounded(self):
+        history = main.reset_conversation()
+        history.append({"role": "user", "content": "find me something"})
+        for step in range(10):
+            main._compact_history(history)
+            self.assertLessEqual(main._estimate_tokens(history), main._HISTORY_TOKEN_LIMIT)
+            _assert_pairs_intact(self, history)
+            _tool_step(history, f"s{step}", 6000)
+        main._compact_history(history)
+        _assert_pairs_intact(self, history)
+        self.assertLessEqual(main._estimate_tokens(history), main._HISTORY_TOKEN_LIMIT)
+
+        # One step summary holding every folded call, then the latest steps intact
+        summaries = _summaries(history, main._STEPS_PREFIX)
+        self.assertEqual(len(summaries), 1)
+        folded = summaries[0]["content"][0]["text"].count("\n- search_flights(")
+        kept = [b["id"] for m in history if m["role"] == "assistant"
+                for b in m["content"] if b.get("type") == "tool_use"]
+        self.assertGreaterEqual(len(kept), main._KEEP_RECENT_STEPS)
+        self.assertEqual(kept, [f"s{step}" for step in range(folded, 10)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from flight_booking_system_mock import MockClaude
+
+
+# (message, expected tool or None, expected subset of its args)
+CASES = [
+    # Search: a known city pair, dated by month keyword
+    ("I want to fly from NYC to Tokyo on 2025-02-15", "search_flights",
+     {"origin": "NYC", "destination": "TYO", "departure_date": "2025-02-15"}),
+    ("Search for flights from LAX to Tokyo in March", "search_flights",
+     {"origin": "LAX", "destination": "TYO", "departure_date": "2025-03-01"}),
+    ("Search for flights from Paris to Rome", None, {}),
+    # Check: "check" plus "availab"/"seat" as word prefixes, so "seat" counts
+    ("Check if flight JL005 has seats for 2 passengers", "check_flight_availability",
+     {"flight_id": "JL005", "passengers": 2}),
+    ("Check if JL062 has a seat for 1", "check_flight_availability",
+     {"flight_id": "JL062", "passengers": 1}),
+    ("Checking availability of AA150 for 3 people", "check_flight_availability",
+     {"flight_id": "AA150", "passengers": 3}),
+    ("recheck seats on JL005", None, {}),
+    # Book: passenger count from "for N" or "N passengers"
+    ("Book flight JL005 for 1, business class, name: Sarah, email: sarah@email.com", "book_flight",
+     {"flight_id": "JL005", "passengers": 1, "cabin_class": "business",
+      "passenger_name": "Sarah", "passenger_email": "sarah@email.com"}),
+    ("Book AA150 for 3 passengers, first class", "book_flight",
+     {"flight_id": "AA150", "passengers": 3, "cabin_class": "first"}),
+    ("Book that flight for 2 passengers", "book_flight",
+     {"flight_id": "JL005", "passengers": 2, "cabin_class": "economy"}),
+    ("rebook AA150", None, {}),
+    # "booking" is a "book" word; check without availability falls through to it
+    ("Check my booking", "book_flight", {"flight_id": "JL005"}),
+    ("Hello there", None, {}),
+]
+
+
+class ProcessMessageTest(unittest.TestCase):
+    def test_intents(self):
+        for message, tool, args in CASES:
+            with self.subTest(message=message):
+                decision = MockClaude().process_message(message)
+                self.assertEqual(decision["tool_call"], tool)
+                if tool is None:
+                    self.assertNotIn("args", decision)
+                else:
+                    self.assertEqual({k: decision["args"][k] for k in args}, args)
+
+
+if __name__ == "__main__":
+    unittest.main()
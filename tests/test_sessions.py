@@ -0,0 +1,47 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+import main
+
+
+class SessionTurnTest(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self):
+        main.SESSIONS.clear()
+
+    async def test_same_user_turns_serialize(self):
+        running = 0
+        overlaps = []
+        tasks = []
+
+        def end_and_send_again():
+            # Runs after the first turn releases the lock, before the queued
+            # turn has resumed to take it
+            main.end_session("alice")
+            tasks.append(asyncio.create_task(main.run_session_turn("alice", "three")))
+
+        async def fake_assistant(user_message, conversation_history):
+            nonlocal running
+            running += 1
+            overlaps.append(running)
+            await asyncio.sleep(0.01)
+            if user_message == "one":
+                asyncio.get_running_loop().call_soon(end_and_send_again)
+            running -= 1
+            return user_message, conversation_history
+
+        with mock.patch.object(main, "run_booking_assistant_async", fake_assistant):
+            tasks.append(asyncio.create_task(main.run_session_turn("alice", "one")))
+            tasks.append(asyncio.create_task(main.run_session_turn("alice", "two")))
+            replies = await asyncio.gather(*tasks[:2])
+            replies.append(await tasks[2])
+
+        self.assertEqual(replies, ["one", "two", "three"])
+        self.assertEqual(max(overlaps), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
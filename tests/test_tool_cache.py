@@ -0,0 +1,86 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+
+import main
+
+
+def _seats(flight_id):
+    return json.loads(main._dispatch(
+        "check_flight_availability", {"flight_id": flight_id, "passengers": 1}
+    ))["seats_available"]
+
+
+class ToolCacheTest(unittest.TestCase):
+    def setUp(self):
+        seats = {flight_id: flight["seats"] for flight_id, (_, flight) in main.FLIGHT_INDEX.items()}
+        self.addCleanup(self._restore, seats)
+        main._TOOL_CACHE.clear()
+        main._SEARCH_CACHE.clear()
+
+    def _restore(self, seats):
+        for flight_id, count in seats.items():
+            main.FLIGHT_INDEX[flight_id][1]["seats"] = count
+        main.BOOKINGS.clear()
+        main._TOOL_CACHE.clear()
+        main._SEARCH_CACHE.clear()
+
+    def _book(self, dispatched):
+        args = {
+            "flight_id": "AA150", "passengers": 3, "cabin_class": "economy",
+            "passenger_name": "Test User", "passenger_email": "test@example.com",
+        }
+        result = main._dispatch("book_flight", args) if dispatched else main.book_flight(**args)
+        return json.loads(result)["booking"]["booking_id"]
+
+    def test_booking_drops_memoized_reads(self):
+        for dispatched in (False, True):
+            with self.subTest(dispatched=dispatched):
+                before = _seats("AA150")
+                self._book(dispatched)
+                self.assertEqual(_seats("AA150"), before - 3)
+
+    def test_cancellation_drops_memoized_reads(self):
+        for dispatched in (False, True):
+            with self.subTest(dispatched=dispatched):
+                booking_id = self._book(dispatched=False)
+                seats = _seats("AA150")
+                view = main._dispatch("view_booking", {"booking_id": booking_id})
+                self.assertEqual(json.loads(view)["status"], "CONFIRMED")
+                args = {"booking_id": booking_id, "passenger_email": "test@example.com"}
+                if dispatched:
+                    main._dispatch("cancel_booking", args)
+                else:
+                    main.cancel_booking(**args)
+                self.assertEqual(_seats("AA150"), seats + 3)
+                view = main._dispatch("view_booking", {"booking_id": booking_id})
+                self.assertEqual(json.loads(view)["status"], "CANCELLED")
+
+    def test_read_racing_a_booking_is_not_stored(self):
+        check = main.TOOL_REGISTRY["check_flight_availability"]
+
+        def check_then_book(**kwargs):
+            result = check(**kwargs)
+            self._book(dispatched=False)  # lands while the read is in flight
+            return result
+
+        with mock.patch.dict(main.TOOL_REGISTRY, {"check_flight_availability": check_then_book}):
+            main._dispatch("check_flight_availability", {"flight_id": "AA150", "passengers": 1})
+        self.assertEqual(main._TOOL_CACHE, {})
+        self.assertEqual(_seats("AA150"), main.FLIGHT_INDEX["AA150"][1]["seats"])
+
+    def test_search_uses_only_its_ttl_cache(self):
+        args = {"origin": "NYC", "destination": "TYO", "departure_date": "2025-02-15"}
+        first = main._dispatch("search_flights", args)
+        self.assertEqual(main._TOOL_CACHE, {})
+        self.assertIn(("NYC", "TYO", "2025-02-15"), main._SEARCH_CACHE)
+        self.assertIs(main._dispatch("search_flights", args), first)
+        self._book(dispatched=False)
+        self.assertNotIn(("NYC", "TYO", "2025-02-15"), main._SEARCH_CACHE)
+
+
+if __name__ == "__main__":
+    unittest.main()